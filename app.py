@@ -1,49 +1,112 @@
-from datetime import datetime
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from io import BytesIO
+import hashlib
+import hmac
 import json
+import math
+from multiprocessing import get_context
+from itertools import islice
+from operator import attrgetter
 import os
+from threading import BoundedSemaphore, Lock
+import time
+from zipfile import ZipFile, ZIP_DEFLATED
+
+from cachetools import LRUCache
 
 from flask import (
-    Flask, render_template, request, redirect,
-    url_for, send_file, flash
+    Blueprint, Flask, Response, abort, current_app, render_template, request,
+    redirect, url_for, send_file, flash, stream_with_context
 )
 from sqlalchemy import (
-    create_engine, Column, Integer, String,
+    create_engine, event, insert, select, Column, Index, Integer, String,
     Float, DateTime, Text
 )
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import DatabaseError
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
+from sqlalchemy.pool import StaticPool
+from sqlalchemy.orm import sessionmaker, scoped_session, declarative_base, load_only
 
 from reportlab.lib.pagesizes import A4
 from reportlab.lib import colors
 from reportlab.lib.units import mm
-from reportlab.platypus import (
-    Table, TableStyle, Paragraph, Spacer, SimpleDocTemplate
-)
-from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.pdfgen import canvas
+from reportlab.platypus import Paragraph
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 
 # ------------------ Config ------------------
-DB_URL = os.getenv("DATABASE_URL", "sqlite:///receipts.db")
 CONFIG_FILE = "config.json"
 
+# Parsed config as (mtime_ns, data), so edits on disk are picked up. Always
+# replaced with a single assignment so threads never see a mixed pair.
+_CFG_CACHE = (None, {})
+
 def load_config():
-    if os.path.exists(CONFIG_FILE):
-        with open(CONFIG_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return {}
+    global _CFG_CACHE
+    try:
+        st = os.stat(CONFIG_FILE)
+    except FileNotFoundError:
+        return {}
+    mtime, data = _CFG_CACHE
+    if st.st_mtime_ns == mtime:
+        return data
+    with open(CONFIG_FILE, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    _CFG_CACHE = (st.st_mtime_ns, data)
+    return data
 
 def save_config(data):
+    global _CFG_CACHE
     with open(CONFIG_FILE, "w", encoding="utf-8") as f:
         json.dump(data, f, indent=2)
+    _CFG_CACHE = (None, {})
 
-# ------------------ App ------------------
-app = Flask(__name__, static_folder="static", template_folder="templates")
-app.secret_key = os.getenv("SECRET_KEY", "dev-key")
+# ------------------ Form parsing ------------------
+def _to_float(v, default=0.0):
+    # "nan"/"inf" parse as floats but are not amounts; SQLite stores NaN as NULL
+    try: f = float(v)
+    except (TypeError, ValueError): return default
+    return f if math.isfinite(f) else default
+
+def _to_int(v, default=None):
+    try: return int(v)
+    except (TypeError, ValueError): return default
 
 # ------------------ Database ------------------
-engine = create_engine(DB_URL, echo=False, future=True)
-SessionLocal = sessionmaker(bind=engine)
+# Engines and sessions are per app (see create_app), never built at import
 Base = declarative_base()
 
+class utcnow(FunctionElement):
+    """Current time as a naive UTC timestamp, computed by the database.
+
+    CURRENT_TIMESTAMP is UTC only on SQLite; elsewhere it follows the session
+    time zone, so each backend gets its explicit UTC form.
+    """
+    type = DateTime()
+    inherit_cache = True
+
+@compiles(utcnow)
+def _utcnow_default(element, compiler, **kw):
+    # SQLite stores CURRENT_TIMESTAMP in UTC
+    return "CURRENT_TIMESTAMP"
+
+@compiles(utcnow, "postgresql")
+def _utcnow_postgresql(element, compiler, **kw):
+    return "TIMEZONE('utc', CURRENT_TIMESTAMP)"
+
+@compiles(utcnow, "mysql")
+def _utcnow_mysql(element, compiler, **kw):
+    # Parenthesized so it is also valid as a column DEFAULT expression
+    return "(UTC_TIMESTAMP())"
+
+@compiles(utcnow, "mssql")
+def _utcnow_mssql(element, compiler, **kw):
+    return "GETUTCDATE()"
+
 class Receipt(Base):
     __tablename__ = "receipts"
     id = Column(Integer, primary_key=True)
@@ -69,27 +132,357 @@ class Receipt(Base):
     amount = Column(Float, default=0.0)
     paid_amount = Column(Float, default=0.0)
 
-    created_at = Column(DateTime, default=datetime.utcnow)
+    # UTC, computed by the database (see utcnow). create() also sets it
+    # explicitly, since tables made by older versions have no server default.
+    created_at = Column(DateTime, server_default=utcnow())
 
-Base.metadata.create_all(bind=engine)
+    __table_args__ = (
+        # Dashboard: ORDER BY created_at DESC, id DESC LIMIT 12, served by
+        # scanning this index backwards with no separate sort step
+        Index("ix_receipts_created_at_id", created_at, id),
+        Index("ix_receipts_reg_no", registration_no, sqlite_where=registration_no.isnot(None)),
+    )
+
+def database_url():
+    return os.getenv("DATABASE_URL", "sqlite:///receipts.db")
+
+def make_engine(db_url):
+    url = make_url(db_url)
+    is_sqlite = url.get_backend_name() == "sqlite"
+    in_memory = is_sqlite and (
+        url.database in (None, "", ":memory:") or url.query.get("mode") == "memory"
+    )
+
+    if in_memory:
+        # One shared connection, otherwise each thread sees its own empty DB
+        pool_args = {"poolclass": StaticPool}
+    else:
+        pool_args = {"pool_size": 10, "max_overflow": 20, "pool_pre_ping": True}
+    engine = create_engine(
+        db_url, echo=False, future=True, **pool_args,
+        connect_args={"check_same_thread": False} if is_sqlite else {},
+    )
+
+    if is_sqlite:
+        @event.listens_for(engine, "connect")
+        def _sqlite_pragmas(dbapi_conn, _record):
+            cur = dbapi_conn.cursor()
+            cur.execute("PRAGMA journal_mode=WAL")
+            cur.execute("PRAGMA synchronous=NORMAL")
+            cur.close()
+    return engine
+
+def _create_schema(engine):
+    Base.metadata.create_all(bind=engine)
+    # create_all skips existing tables; add any indexes an older database lacks
+    for ix in Receipt.__table__.indexes:
+        ix.create(bind=engine, checkfirst=True)
+    # Superseded by ix_receipts_created_at_id
+    Index("ix_receipts_created_at", Receipt.created_at).drop(bind=engine, checkfirst=True)
+
+def init_db(engine, attempts=3):
+    # Several processes may boot against a fresh database at once; the
+    # check-then-create calls can then lose a race ("already exists", or
+    # "database is locked" on SQLite). Re-running sees the finished schema.
+    for attempt in range(attempts):
+        try:
+            _create_schema(engine)
+            return
+        except DatabaseError:
+            if attempt == attempts - 1:
+                raise
+            time.sleep(0.1 * (attempt + 1))
+
+def _state():
+    """Per-app engine, session registry and PDF cache (set up by create_app)."""
+    return current_app.extensions["receipts"]
+
+def _session():
+    return _state()["session"]()
+
+# ------------------ PDF ------------------
+# The receipt layout is fixed, so it is drawn straight onto a canvas rather
+# than going through Platypus flowables. Only free-text cells (addresses,
+# particulars) are wrapped with a Paragraph into a known box.
+PAGE_W, PAGE_H = A4
+_PDF_MARGIN = 24
+_LEFT = _PDF_MARGIN
+_CONTENT_W = PAGE_W - 2 * _PDF_MARGIN
+_FONT, _ITALIC = "Helvetica", "Helvetica-Oblique"
+
+_CELL_PAD = 6          # horizontal cell padding
+_CELL_VPAD = 3         # vertical cell padding
+_ROW_H = 18            # single-line row at 10pt
+_CELL_BASELINE = 13    # first baseline below a row's top edge
+
+_META_COLS = (40*mm, _CONTENT_W - 40*mm)
+_INFO_COLS = (35*mm, _CONTENT_W - 35*mm)
+_ITEMS_COLS = (20*mm, _CONTENT_W - 60*mm, 40*mm)
+
+_STYLES = getSampleStyleSheet()
+_HEADER_STYLE = _STYLES["Normal"]
+_CELL_STYLE = ParagraphStyle("cell", parent=_STYLES["Normal"], fontName=_FONT, fontSize=10, leading=12)
+
+# Static text, shared by every build
+_ITEMS_HEADER = ("Sl. No", "Particulars", "Amount (INR)")
+_PAID_LABEL = "Paid Amount"
+_FOOTER_TEXT = "This is a computer generated receipt."
+
+# Receipts are never edited after creation, so a rendered PDF is a pure
+# function of its id and can be served from memory on repeat downloads.
+# Each app keeps its own cache of (pdf_bytes, etag) entries.
+_PDF_CACHE_SIZE = 256
+_PDF_MAX_AGE = 31536000  # one year; only for versioned URLs, see _pdf_version
+
+def _pdf_version(rid, created_at):
+    """Signed version tag for a receipt's PDF URL.
+
+    Ids alone are reused if the database is recreated, so a long-lived public
+    cache entry must be keyed to the exact row; created_at pins it, and the
+    app secret keeps the tag from being forged.
+    """
+    msg = f"{rid}:{created_at.isoformat()}".encode()
+    return hmac.new(current_app.secret_key.encode(), msg, "sha256").hexdigest()[:16]
+
+# User text is Paragraph markup once wrapped; escape it in a single C-level
+# pass, turning newlines into line breaks along the way.
+_HTML_ESC = str.maketrans({"&": "&amp;", "<": "&lt;", ">": "&gt;", "\n": "<br/>", "\r": None})
+
+def _esc(s):
+    return (s or "").translate(_HTML_ESC)
+
+def _para(text):
+    return Paragraph(_esc(text), _CELL_STYLE)
+
+def _draw_table(c, top, rows, cols, box, header_bg=None, right_cols=()):
+    """Draw `rows` (str or Paragraph cells) below `top`; returns the bottom y."""
+    heights = []
+    for row in rows:
+        h = _ROW_H
+        for cell, w in zip(row, cols):
+            if isinstance(cell, Paragraph):
+                h = max(h, cell.wrap(w - 2 * _CELL_PAD, PAGE_H)[1] + 2 * _CELL_VPAD)
+        heights.append(h)
+    width = sum(cols)
+    bottom = top - sum(heights)
+
+    if header_bg is not None:
+        c.setFillColor(header_bg)
+        c.rect(_LEFT, top - heights[0], width, heights[0], stroke=0, fill=1)
+        c.setFillColor(colors.black)
+
+    # Inner grid, then the outer box on top of it
+    c.setStrokeColor(colors.grey)
+    c.setLineWidth(0.25)
+    y = top
+    for h in heights[:-1]:
+        y -= h
+        c.line(_LEFT, y, _LEFT + width, y)
+    x = _LEFT
+    for w in cols[:-1]:
+        x += w
+        c.line(x, top, x, bottom)
+    c.setStrokeColor(colors.black)
+    c.setLineWidth(box)
+    c.rect(_LEFT, bottom, width, top - bottom)
+
+    c.setFont(_FONT, 10)
+    y = top
+    for row, h in zip(rows, heights):
+        x = _LEFT
+        for i, (cell, w) in enumerate(zip(row, cols)):
+            if isinstance(cell, Paragraph):
+                cell.drawOn(c, x + _CELL_PAD, y - _CELL_VPAD - cell.height)
+            elif i in right_cols:
+                c.drawRightString(x + w - _CELL_PAD, y - _CELL_BASELINE, cell)
+            else:
+                c.drawString(x + _CELL_PAD, y - _CELL_BASELINE, cell)
+            x += w
+        y -= h
+    return bottom
+
+# Every field the layout reads, fetched in one attrgetter call per build
+_RECEIPT_FIELDS = attrgetter(
+    "org_name", "org_address", "org_phone", "org_email",
+    "created_at", "registration_no",
+    "name", "guardian", "gender", "age", "address", "phone", "consultant",
+    "item_desc", "amount", "paid_amount",
+)
+
+def _build_receipt_pdf(r, buf):
+    (org_name, org_address, org_phone, org_email,
+     created_at, registration_no,
+     name, guardian, gender, age, address, phone, consultant,
+     item_desc, amount, paid_amount) = _RECEIPT_FIELDS(r)
+
+    c = canvas.Canvas(buf, pagesize=A4)
+    y = PAGE_H - _PDF_MARGIN
+
+    # Header (Org); names can exceed one line at 18pt, so let it wrap
+    p = Paragraph(_esc(org_name), _STYLES["Title"])
+    _, h = p.wrap(_CONTENT_W, PAGE_H)
+    p.drawOn(c, _LEFT, y - h)
+    y -= h + _STYLES["Title"].spaceAfter
+    meta = []
+    if org_address: meta.append(_esc(org_address))
+    contact = " ".join(x for x in [org_phone or "", org_email or ""] if x).strip()
+    if contact: meta.append(_esc(contact))
+    if meta:
+        p = Paragraph("<br/>".join(meta), _HEADER_STYLE)
+        _, h = p.wrap(_CONTENT_W, PAGE_H)
+        p.drawOn(c, _LEFT, y - h)
+        y -= h
+    y -= 8
+
+    # Meta table (date / reg no)
+    y = _draw_table(c, y, (
+        ("Receipt Date", created_at.strftime("%Y-%m-%d %H:%M")),
+        ("Registration No.", registration_no or "-"),
+    ), _META_COLS, box=0.4) - 10
+
+    # Client table
+    y = _draw_table(c, y, (
+        ("Name", name),
+        ("Guardian", guardian or "-"),
+        ("Gender", gender or "-"),
+        ("Age", str(age) if age is not None else "-"),
+        ("Address", _para(address) if address else "-"),
+        ("Phone", phone or "-"),
+        ("Consultant", consultant or "-"),
+    ), _INFO_COLS, box=0.5) - 12
+
+    # Line item table
+    y = _draw_table(c, y, (
+        _ITEMS_HEADER,
+        ("1", _para(item_desc or ""), f"{amount:,.2f}"),
+    ), _ITEMS_COLS, box=0.7, header_bg=colors.lightgrey, right_cols=(2,)) - 6
+
+    # Totals
+    c.setFont(_FONT, 12)
+    c.drawString(_LEFT + _CELL_PAD, y - 15, _PAID_LABEL)
+    c.drawRightString(_LEFT + _CONTENT_W - _CELL_PAD, y - 15, f"INR {paid_amount:,.2f}")
+    y -= 21 + 14
+
+    c.setFont(_ITALIC, 10)
+    c.drawString(_LEFT, y - 10, _FOOTER_TEXT)
+
+    c.showPage()
+    c.save()
+
+# ------------------ Bulk export ------------------
+# ReportLab is pure Python and CPU-bound, so bulk builds fan out to processes.
+# One bounded pool per web worker, created on first use. Its processes are
+# spawned rather than forked, since the web worker may be running threads.
+_EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", min(4, os.cpu_count() or 1)))
+_EXPORT_WINDOW = 2 * _EXPORT_WORKERS  # jobs in flight per export
+_export_pool = None
+_export_pool_lock = Lock()
+# At most one export streams per web worker at a time
+_export_slot = BoundedSemaphore(1)
+
+def _get_export_pool():
+    global _export_pool
+    with _export_pool_lock:
+        if _export_pool is None:
+            _export_pool = ProcessPoolExecutor(
+                max_workers=_EXPORT_WORKERS,
+                mp_context=get_context("spawn"),
+            )
+        return _export_pool
+
+# Pool processes open their own engine per database URL, on first use
+_worker_sessions = {}
+
+def _render_pdf_job(db_url, rid):
+    factory = _worker_sessions.get(db_url)
+    if factory is None:
+        factory = _worker_sessions[db_url] = sessionmaker(bind=make_engine(db_url), future=True)
+    with factory() as db:
+        r = db.get(Receipt, rid)
+        buf = BytesIO()
+        _build_receipt_pdf(r, buf)
+    return buf.getvalue()
+
+class _ZipSink:
+    """Write-only, unseekable target; zip bytes are drained after each entry."""
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def _iter_receipts_zip(state, rids):
+    with state["pdf_cache_lock"]:
+        cache = state["pdf_cache"]
+        cached = {rid: cache[rid][0] for rid in rids if rid in cache}
+    missing = [rid for rid in rids if rid not in cached]
+
+    sink = _ZipSink()
+    with ZipFile(sink, "w", compression=ZIP_DEFLATED) as zf:
+        for rid, pdf in cached.items():
+            zf.writestr(f"receipt_{rid}.pdf", pdf)
+            yield sink.drain()
+
+        # Keep only a small window of jobs in flight, so rendered PDFs never
+        # pile up in memory faster than the client reads the stream
+        pool = _get_export_pool()
+        render = partial(_render_pdf_job, state["db_url"])
+        pending = iter(missing)
+        window = deque()
+        try:
+            for rid in islice(pending, _EXPORT_WINDOW):
+                window.append((rid, pool.submit(render, rid)))
+            while window:
+                rid, fut = window.popleft()
+                zf.writestr(f"receipt_{rid}.pdf", fut.result())
+                for nxt in islice(pending, 1):
+                    window.append((nxt, pool.submit(render, nxt)))
+                yield sink.drain()
+        finally:
+            # Client went away mid-stream: drop the jobs not yet started
+            for _, fut in window:
+                fut.cancel()
+    yield sink.drain()
 
 # ------------------ Guards ------------------
-@app.before_request
+# Reachable before the organization is configured
+_SETUP_ENDPOINTS = frozenset({"receipts.setup_get", "receipts.setup_post", "static"})
+_STATIC_URL_PATH = "/static"
+_STATIC_PREFIX = _STATIC_URL_PATH + "/"
+
+bp = Blueprint("receipts", __name__)
+
+@bp.before_app_request
 def ensure_config():
-    # Allow access to setup, static, and favicon even if not configured yet
-    if request.endpoint in {"setup_get", "setup_post", "static"}:
+    # Static assets never need the config
+    if request.path.startswith(_STATIC_PREFIX):
+        return
+    if request.endpoint in _SETUP_ENDPOINTS:
         return
     cfg = load_config()
     if not cfg:
-        return redirect(url_for("setup_get"))
+        return redirect(url_for("receipts.setup_get"))
+
+@bp.teardown_app_request
+def remove_session(exc=None):
+    _state()["session"].remove()
 
 # ------------------ Routes ------------------
-@app.get("/setup")
+@bp.get("/setup")
 def setup_get():
     cfg = load_config()
     return render_template("setup.html", cfg=cfg)
 
-@app.post("/setup")
+@bp.post("/setup")
 def setup_post():
     form = request.form
     cfg = {
@@ -100,35 +493,34 @@ def setup_post():
     }
     if not cfg["org_name"]:
         flash("Organization/Clinic name is required.", "error")
-        return redirect(url_for("setup_get"))
+        return redirect(url_for("receipts.setup_get"))
     save_config(cfg)
     flash("Organization settings saved.", "success")
-    return redirect(url_for("index"))
+    return redirect(url_for("receipts.index"))
 
-@app.get("/")
+@bp.get("/")
 def index():
-    db = SessionLocal()
-    receipts = db.query(Receipt).order_by(Receipt.created_at.desc()).limit(12).all()
-    db.close()
+    # Only load the columns the "Recent Receipts" table renders
+    stmt = (
+        select(Receipt)
+        .options(load_only(Receipt.id, Receipt.name, Receipt.paid_amount, Receipt.created_at))
+        # CURRENT_TIMESTAMP has one-second resolution; id breaks ties
+        .order_by(Receipt.created_at.desc(), Receipt.id.desc())
+        .limit(12)
+    )
+    with _session() as db:
+        receipts = db.execute(stmt).scalars().all()
     cfg = load_config()
     return render_template("index.html", receipts=receipts, cfg=cfg)
 
-@app.post("/create")
+@bp.post("/create")
 def create():
     cfg = load_config()
     if not cfg:
-        return redirect(url_for("setup_get"))
+        return redirect(url_for("receipts.setup_get"))
 
     form = request.form
-    # Parse numeric fields safely
-    def to_float(v, default=0.0):
-        try: return float(v)
-        except: return default
-    def to_int(v, default=None):
-        try: return int(v)
-        except: return default
-
-    r = Receipt(
+    data = dict(
         # Snapshot org info at time of creation
         org_name=cfg.get("org_name", ""),
         org_address=cfg.get("org_address"),
@@ -141,108 +533,133 @@ def create():
         guardian=form.get("guardian"),
         address=form.get("address"),
         gender=form.get("gender"),
-        age=to_int(form.get("age")),
+        age=_to_int(form.get("age")),
         phone=form.get("phone"),
         consultant=form.get("consultant"),
 
         # Line item
         item_desc=form.get("item_desc", "Consultation Fees"),
-        amount=to_float(form.get("amount", 0)),
-        paid_amount=to_float(form.get("paid_amount", 0)),
+        amount=_to_float(form.get("amount", 0)),
+        paid_amount=_to_float(form.get("paid_amount", 0)),
     )
-    if not r.name:
+    if not data["name"]:
         flash("Name is required.", "error")
-        return redirect(url_for("index"))
+        return redirect(url_for("receipts.index"))
 
-    db = SessionLocal()
-    db.add(r)
-    db.commit()
-    rid = r.id
-    db.close()
+    # Single-row Core INSERT ... RETURNING skips the ORM unit-of-work flush
+    with _session() as db:
+        stmt = insert(Receipt).values(created_at=utcnow(), **data)
+        rid = db.execute(stmt.returning(Receipt.id)).scalar_one()
+        db.commit()
     flash("Receipt saved.", "success")
-    return redirect(url_for("preview", rid=rid))
+    return redirect(url_for("receipts.preview", rid=rid))
 
-@app.get("/receipt/<int:rid>")
+@bp.get("/receipt/<int:rid>")
 def preview(rid: int):
-    db = SessionLocal()
-    r = db.get(Receipt, rid)
-    db.close()
+    with _session() as db:
+        r = db.get(Receipt, rid)
     if not r:
         flash("Receipt not found.", "error")
-        return redirect(url_for("index"))
-    return render_template("receipt.html", r=r)
+        return redirect(url_for("receipts.index"))
+    return render_template("receipt.html", r=r, pdf_version=_pdf_version(r.id, r.created_at))
 
-@app.get("/receipt/<int:rid>/pdf")
+@bp.get("/receipt/<int:rid>/pdf")
 def receipt_pdf(rid: int):
-    db = SessionLocal()
-    r = db.get(Receipt, rid)
-    db.close()
-    if not r:
-        flash("Receipt not found.", "error")
-        return redirect(url_for("index"))
-
-    # ---- Generate PDF ----
-    buf = BytesIO()
-    doc = SimpleDocTemplate(
-        buf, pagesize=A4, rightMargin=24, leftMargin=24, topMargin=24, bottomMargin=24
+    state = _state()
+    with state["pdf_cache_lock"]:
+        entry = state["pdf_cache"].get(rid)
+    if entry is None:
+        with _session() as db:
+            r = db.get(Receipt, rid)
+        if not r:
+            flash("Receipt not found.", "error")
+            return redirect(url_for("receipts.index"))
+        buf = BytesIO()
+        _build_receipt_pdf(r, buf)
+        pdf = buf.getvalue()
+        entry = (
+            pdf,
+            hashlib.blake2b(pdf, digest_size=16).hexdigest(),
+            _pdf_version(rid, r.created_at),
+        )
+        with state["pdf_cache_lock"]:
+            state["pdf_cache"][rid] = entry
+    pdf, etag, version = entry
+    # Conditional requests with a matching ETag get a 304 either way
+    resp = send_file(
+        BytesIO(pdf), as_attachment=True, download_name=f"receipt_{rid}.pdf",
+        mimetype="application/pdf", etag=etag, conditional=True,
     )
-    styles = getSampleStyleSheet()
-    elems = []
+    if hmac.compare_digest(request.args.get("v", ""), version):
+        # URL is pinned to this exact row: safe for proxies to keep for good
+        resp.cache_control.no_cache = None
+        resp.cache_control.public = True
+        resp.cache_control.max_age = _PDF_MAX_AGE
+        resp.cache_control.immutable = True
+    else:
+        # Bare id URL: the id may later name a different receipt, so only the
+        # browser may store it, and must revalidate every time
+        resp.cache_control.private = True
+        resp.cache_control.no_cache = True
+    return resp
+
+@bp.get("/receipts/bulk.zip")
+def receipts_bulk_zip():
+    # Admin only: disabled unless EXPORT_TOKEN is set, then the caller must
+    # send it as "Authorization: Bearer <token>" or ?token=<token>
+    expected = os.getenv("EXPORT_TOKEN")
+    if not expected:
+        abort(404)
+    auth = request.headers.get("Authorization", "")
+    given = auth[7:] if auth.startswith("Bearer ") else request.args.get("token", "")
+    if not hmac.compare_digest(given.encode(), expected.encode()):
+        abort(403)
+
+    if not _export_slot.acquire(blocking=False):
+        return Response("An export is already running, try again shortly.\n",
+                        status=429, headers={"Retry-After": "30"}, mimetype="text/plain")
+    try:
+        with _session() as db:
+            rids = db.execute(select(Receipt.id).order_by(Receipt.id)).scalars().all()
+        resp = Response(
+            stream_with_context(_iter_receipts_zip(_state(), rids)),
+            mimetype="application/zip",
+            headers={"Content-Disposition": "attachment; filename=receipts.zip"},
+        )
+    except BaseException:
+        _export_slot.release()
+        raise
+    resp.call_on_close(_export_slot.release)
+    return resp
 
-    # Header (Org)
-    elems.append(Paragraph(f"<b>{r.org_name}</b>", styles["Title"]))
-    meta = []
-    if r.org_address: meta.append(r.org_address.replace("\n", "<br/>"))
-    contact = " ".join(x for x in [r.org_phone or "", r.org_email or ""] if x).strip()
-    if contact: meta.append(contact)
-    if meta:
-        elems.append(Paragraph("<br/>".join(meta), styles["Normal"]))
-    elems.append(Spacer(1, 8))
-
-    # Meta table (date / reg no)
-    meta_table = [
-        ["Receipt Date", r.created_at.strftime("%Y-%m-%d %H:%M")],
-        ["Registration No.", r.registration_no or "-"],
-    ]
-    t_meta = Table(meta_table, colWidths=[40*mm, None])
-    t_meta.setStyle(TableStyle([
-        ("BOX", (0,0), (-1,-1), 0.4, colors.black),
-        ("INNERGRID", (0,0), (-1,-1), 0.25, colors.grey),
-        ("VALIGN", (0,0), (-1,-1), "MIDDLE"),
-    ]))
-    elems += [t_meta, Spacer(1, 10)]
-
-    # Client table
-    info = [
-        ["Name", r.name],
-        ["Guardian", r.guardian or "-"],
-        ["Gender", r.gender or "-"],
-        ["Age", str(r.age) if r.age is not None else "-"],
-        ["Address", r.address or "-"],
-        ["Phone", r.phone or "-"],
-        ["Consultant", r.consultant or "-"],
-    ]
-    t1 = Table(info, colWidths=[35*mm, None])
-    t1.setStyle(TableStyle([("BOX", (0,0), (-1,-1), 0.5, colors.black),("INNERGRID", (0,0), (-1,-1), 0.25, colors.grey),("VALIGN", (0,0), (-1,-1), "TOP"),]))
-    elems += [t1, Spacer(1, 12)]
-
-    # Line item table
-    items = [["Sl. No", "Particulars", "Amount (INR)"],
-             ["1", r.item_desc, f"{r.amount:,.2f}"]]
-    t2 = Table(items, colWidths=[20*mm, None, 40*mm])
-    t2.setStyle(TableStyle([("BOX", (0,0), (-1,-1), 0.7, colors.black),("INNERGRID", (0,0), (-1,-1), 0.25, colors.grey),("BACKGROUND", (0,0), (-1,0), colors.lightgrey),("ALIGN", (2,1), (2,-1), "RIGHT"),]))
-    elems += [t2, Spacer(1, 6)]
-
-    # Totals
-    totals = [["Paid Amount", f"INR {r.paid_amount:,.2f}"]]
-    t3 = Table(totals, colWidths=[None, 55*mm])
-    t3.setStyle(TableStyle([("ALIGN", (1,0), (1,-1), "RIGHT"),("FONTSIZE", (0,0), (-1,-1), 12),]))
-    elems += [t3, Spacer(1, 14)]
-    elems.append(Paragraph("This is a computer generated receipt.", styles["Italic"]))
+# ------------------ App ------------------
+def create_app(db_url=None) -> Flask:
+    app = Flask(
+        __name__, static_folder="static", static_url_path=_STATIC_URL_PATH,
+        template_folder="templates",
+    )
+    secret_key = os.getenv("SECRET_KEY")
+    if not secret_key:
+        secret_key = "dev-key"
+        if not os.getenv("FLASK_DEV"):
+            app.logger.warning("SECRET_KEY is not set; using the insecure development key")
+    app.secret_key = secret_key
+
+    db_url = db_url or database_url()
+    engine = make_engine(db_url)
+    init_db(engine)
+    app.extensions["receipts"] = {
+        "db_url": db_url,
+        "engine": engine,
+        # One session per request/thread, released on request teardown
+        "session": scoped_session(sessionmaker(bind=engine, expire_on_commit=False, future=True)),
+        "pdf_cache": LRUCache(maxsize=_PDF_CACHE_SIZE),
+        "pdf_cache_lock": Lock(),
+    }
 
-    doc.build(elems)
-    buf.seek(0)
-    return send_file(buf, as_attachment=True, download_name=f"receipt_{r.id}.pdf", mimetype="application/pdf")
+    app.register_blueprint(bp)
+    return app
 
 if __name__ == "__main__":
-    app.run(debug=True)
+    # Werkzeug dev server only; serve with gunicorn in production (see wsgi.py)
+    create_app().run(debug=bool(os.getenv("FLASK_DEV")))
@@ -0,0 +1,27 @@
+# Gunicorn settings: gunicorn -c gunicorn.conf.py wsgi:app
+from multiprocessing import cpu_count
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", cpu_count() * 2 + 1))
+
+# "sync" (default), "gthread" or "gevent" (pip install gevent). The latter two
+# overlap PDF builds with slow clients inside each worker process.
+worker_class = os.getenv("WORKER_CLASS", "sync")
+threads = int(os.getenv("THREADS", 8 if worker_class == "gthread" else 1))
+worker_connections = int(os.getenv("WORKER_CONNECTIONS", 200))
+
+keepalive = 2
+# Sync workers are killed after this many seconds on a single request,
+# which also bounds how long /receipts/bulk.zip may stream
+timeout = int(os.getenv("TIMEOUT", 30))
+
+def on_starting(server):
+    # Create the schema once in the arbiter, before workers boot and race to
+    # do it themselves. Workers still run init_db(), which then only checks.
+    from app import database_url, init_db, make_engine
+    engine = make_engine(database_url())
+    try:
+        init_db(engine)
+    finally:
+        engine.dispose()